@@ -0,0 +1,16 @@
+#!/bin/sh
+# Build the native proof-of-work kernels loaded by pow_native.py.
+# Run before the server starts (see Procfile). A kernel that is already up to date is kept,
+# one that can't be built (no gcc, not x86-64) is skipped and mining falls back to Numba or hashlib.
+cd "$(dirname "$0")" || exit 0
+
+for kernel in pow_sha_ni pow_multiway; do
+    if [ "$kernel.so" -nt "$kernel.c" ]; then
+        continue
+    fi
+    if ! command -v gcc >/dev/null 2>&1 || ! gcc -O3 -shared -fPIC -o "$kernel.so" "$kernel.c"; then
+        echo "build_kernels.sh: could not build $kernel.so, mining will use a fallback" >&2
+    fi
+done
+
+exit 0
@@ -1,30 +1,155 @@
-from time import time
+from time import time, monotonic
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import RLock
 import hashlib
 import json
+from json.encoder import encode_basestring_ascii
+import math
+import os
+import orjson
 from uuid import uuid4
 from textwrap import dedent
-from flask import Flask,jsonify, request
+from flask import Flask, request, Response
 from flask_cors import CORS
 from urllib.parse import urlparse
 import requests
 from pathlib import Path
+import pow_native
+import pow_numba
+
+# Leading zero bits a proof's hash needs, 16 bits being the original 4 leading zero hex digits
+DIFFICULTY_BITS = 16
+# A digest meets the difficulty iff, read as a big-endian number, it is below this.
+# Comparing bytes does that in one memcmp, no hex or int conversion
+PROOF_TARGET = (1 << (256 - DIFFICULTY_BITS)).to_bytes(32, 'big')
+
+# Numba is the mining path when no native kernel was built, compile it before serving
+if pow_native.KERNEL is None:
+    pow_numba.warm_up()
+
+def json_bytes(data):
+    """Serialize to JSON bytes with orjson, falling back to json for values it rejects (e.g. >64-bit ints)"""
+    try:
+        return orjson.dumps(data)
+    except orjson.JSONEncodeError:
+        return json.dumps(data, separators=(',', ':')).encode()
+
+def json_response(data, status=200):
+    """Build a JSON response with orjson instead of jsonify"""
+    return Response(json_bytes(data), status=status, mimetype='application/json')
+
+# Array items per chunk when streaming, so big responses aren't written to the socket item by item
+STREAM_BATCH = 256
+
+def stream_json(head, encoded_items, tail):
+    """
+    Stream a JSON document built around one large array, without assembling it in memory
+    :param head: <bytes> Everything up to and including the array's opening '['
+    :param encoded_items: <list> The array's items, already encoded
+    :param tail: <bytes> Everything from the array's closing ']'
+    :return: <Response>
+    """
+    def generate():
+        yield head
+        for start in range(0, len(encoded_items), STREAM_BATCH):
+            if start:
+                yield b','
+            yield b','.join(encoded_items[start:start + STREAM_BATCH])
+        yield tail
+    return Response(generate(), status=200, mimetype='application/json')
+
+def append_ndjson(path, value):
+    """Append one JSON line to an append-only log and flush it to disk"""
+    append_ndjson_bytes(path, json_bytes(value))
+
+def append_ndjson_bytes(path, data):
+    """Like append_ndjson, for a value the caller already encoded"""
+    with open(path, 'ab') as f:
+        f.write(data + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def write_ndjson(path, values):
+    """Atomically rewrite an append-only log with the given values"""
+    tmp_file = path.with_suffix('.tmp')
+    with open(tmp_file, 'wb') as f:
+        for value in values:
+            f.write(json_bytes(value) + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+def read_ndjson(path):
+    """
+    Read an append-only log, one JSON value per line.
+    A last line cut off by an interrupted append is truncated away, so later appends start on a clean line.
+    :param path: <Path> Log file
+    :return: <list> The values
+    """
+    # json_bytes writes raw UTF-8, so decode that rather than the locale's encoding
+    lines = []
+    offset = 0
+    with open(path, 'rb') as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                lines.append((number, offset, line))
+            offset += len(line)
+
+    values = []
+    for position, (number, start, line) in enumerate(lines, 1):
+        try:
+            values.append(json.loads(line))
+        except ValueError:
+            # JSONDecodeError, or UnicodeDecodeError if the cut went through a multi-byte character
+            # Only the last append can have been interrupted, a bad line before it is real corruption
+            if position < len(lines):
+                raise ValueError(f'{path}: line {number} is not valid JSON') from None
+            # Keep what came before the partial line
+            with open(path, 'r+b') as f:
+                f.truncate(start)
+                f.flush()
+                os.fsync(f.fileno())
+            return values
+
+    if lines and not lines[-1][2].endswith(b'\n'):
+        # The append was cut off right before its newline, finish the line
+        with open(path, 'ab') as f:
+            f.write(b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+    return values
 
 class Blockchain(object):
     def __init__(self, data_dir='data'):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
-        self.chain_file = self.data_dir / 'blockchain.json'
+        # Blocks are appended one JSON object per line, pending transactions to a log of their own
+        # that is emptied whenever they are mined into a block
+        self.chain_file = self.data_dir / 'blocks.ndjson'
+        self.mempool_file = self.data_dir / 'mempool.ndjson'
+        # Pre-ndjson formats, migrated on first load
+        self.legacy_chain_file = self.data_dir / 'blockchain.json'
+        self.legacy_mempool_file = self.data_dir / 'mempool.json'
         
         self.chain = []
         self.current_transactions = []
         self.nodes = set()
+        # Hash of the tip of the chain, so mining doesn't have to rehash it
+        self._last_hash = '0'
+        # Running balance per address, covering the chain and pending transactions
+        self.balances = defaultdict(int)
+        # Each block encoded once, streamed by /chain and /nodes/resolve
+        self._block_json = []
+        # Guards the chain, pending transactions and everything derived from them.
+        # Hold it across check-then-mutate sequences such as spending a balance.
+        self.lock = RLock()
         
         # Load existing blockchain or create new one
-        if self.chain_file.exists():
+        if self.chain_file.exists() or self.legacy_chain_file.exists():
             self.load_chain()
         else:
             self.new_block(proof=100, previous_hash='0')
-            self.save_chain()
         
     def new_block(self, proof, previous_hash = None):
         """
@@ -34,20 +159,28 @@ class Blockchain(object):
         :return: <dict> New Block
         """
         
-        block = {
-            'index': len(self.chain) + 1,
-            'timestamp' : time(),
-            'transactions' : self.current_transactions,
-            'proof' : proof,
-            'previous_hash' : previous_hash or self.hash(self.chain[-1]),
-            }
-        
-        # Reset the current list of transactions
-        self.current_transactions = []
+        with self.lock:
+            block = {
+                'index': len(self.chain) + 1,
+                'timestamp' : time(),
+                'transactions' : self.current_transactions,
+                'proof' : proof,
+                'previous_hash' : previous_hash or self._last_hash,
+                }
+            # Hashed once here, the stored value is what the next block links to
+            block['hash'] = self.hash(block)
+            
+            # Reset the current list of transactions
+            self.current_transactions = []
 
-        self.chain.append(block)
-        self.save_chain()  # Save after adding new block
-        return block
+            self.chain.append(block)
+            self._last_hash = block['hash']
+            # Encoded once, for /chain and for the log
+            block_json = json_bytes(block)
+            self._block_json.append(block_json)
+            self.append_block(block_json)  # Save after adding new block
+            self.save_mempool()
+            return block
     
     def new_transaction(self, sender, recipient, amount):
         """
@@ -58,26 +191,99 @@ class Blockchain(object):
         :return: <int> The index of the Block that will hold this transaction
         """
 
-        self.current_transactions.append({
-            'sender' : sender,
-            'recipient' : recipient,
-            'amount' : amount,
-        })
+        with self.lock:
+            transaction = {
+                'sender' : sender,
+                'recipient' : recipient,
+                'amount' : amount,
+            }
+            # On disk first, so a pending payout or post fee survives a restart
+            append_ndjson(self.mempool_file, transaction)
+            self.current_transactions.append(transaction)
+            self.balances[recipient] += amount
+            self.balances[sender] -= amount
 
-        return self.last_block['index'] + 1
+            return self.last_block['index'] + 1
     
+    @staticmethod
+    def valid_transaction(tx):
+        """
+        Check that a transaction has the shape the balance index relies on
+        :param tx: <dict> Transaction
+        :return: <bool> True if valid, False if not
+        """
+
+        # bool is an int subclass, hence the exact type checks
+        return (type(tx) is dict and type(tx.get('amount')) is int
+                and type(tx.get('sender')) is str and type(tx.get('recipient')) is str)
+
     @staticmethod
     def hash(block):
         """
-        Creates a SHA-256 hash of a Block
+        Creates a SHA-256 hash of a Block, not counting its own stored 'hash' field
         :param block: <dict> Block
         :return: <str>
         """
 
         # We must make sure that the Dictionary is Ordered, or we'll have insconsistent hashes
-        block_string = json.dumps(block, sort_keys=True).encode()
+        # Stays on json.dumps' format: orjson's compact separators would change every existing block hash
+        block_string = Blockchain.serialize(block).encode()
         return hashlib.sha256(block_string).hexdigest()
 
+    @staticmethod
+    def serialize(block):
+        """
+        Encode a Block exactly like json.dumps(block, sort_keys=True), leaving out its 'hash' field.
+        Blocks of the usual shape are written with the keys in their known sorted order, skipping
+        the sort and the generic encoder; anything else goes through json.dumps.
+        :param block: <dict> Block
+        :return: <str>
+        """
+
+        block_string = Blockchain._serialize_known(block)
+        if block_string is not None:
+            return block_string
+
+        if 'hash' in block:
+            block = {key: value for key, value in block.items() if key != 'hash'}
+        return json.dumps(block, sort_keys=True)
+
+    @staticmethod
+    def _serialize_known(block):
+        """The fast path of serialize, or None if the block isn't of the usual shape"""
+        if len(block) - ('hash' in block) != 5:
+            return None
+
+        index = block.get('index')
+        timestamp = block.get('timestamp')
+        transactions = block.get('transactions')
+        proof = block.get('proof')
+        previous_hash = block.get('previous_hash')
+
+        # bool is an int subclass that json writes as true/false, hence the exact type checks
+        if type(index) is not int or type(proof) is not int or type(previous_hash) is not str:
+            return None
+        if type(transactions) is not list:
+            return None
+        # json writes floats with repr, except inf/nan
+        if not (type(timestamp) is float and math.isfinite(timestamp) or type(timestamp) is int):
+            return None
+
+        tx_strings = []
+        for tx in transactions:
+            if type(tx) is not dict or len(tx) != 3:
+                return None
+            amount = tx.get('amount')
+            recipient = tx.get('recipient')
+            sender = tx.get('sender')
+            if type(amount) is not int or type(recipient) is not str or type(sender) is not str:
+                return None
+            tx_strings.append('{"amount": %d, "recipient": %s, "sender": %s}' % (
+                amount, encode_basestring_ascii(recipient), encode_basestring_ascii(sender)))
+
+        return '{"index": %d, "previous_hash": %s, "proof": %d, "timestamp": %r, "transactions": [%s]}' % (
+            index, encode_basestring_ascii(previous_hash), proof, timestamp, ', '.join(tx_strings))
+
     @property
     def last_block(self):
         return self.chain[-1]
@@ -85,30 +291,43 @@ class Blockchain(object):
     def proof_of_work(self,last_proof):
         """
         Simple proof of Work Algorithm:
-        - Find a number p' such that hash(pp') contains leading 4 zeroes, where p is the previous p'
+        - Find a number p' such that hash(pp') starts with DIFFICULTY_BITS zero bits, where p is the previous p'
         - p is the previous proof, and p' is the new proof
         :param last_proof: <int>
         :return: <int>
         """
 
+        # Use a native SIMD kernel when one has been built for this CPU
+        proof = pow_native.mine(last_proof, DIFFICULTY_BITS)
+        if proof is not None:
+            return proof
+
+        # Otherwise the Numba-compiled search, if Numba is installed
+        proof = pow_numba.mine(last_proof, DIFFICULTY_BITS)
+        if proof is not None:
+            return proof
+
+        # Fall back to hashlib. The prefix is absorbed once and the hash state copied per attempt
+        base = hashlib.sha256(str(last_proof).encode())
         proof = 0
-        while self.valid_proof(last_proof, proof) is False:
+        while True:
+            guess_hash = base.copy()
+            guess_hash.update(b'%d' % proof)
+            if guess_hash.digest() < PROOF_TARGET:
+                return proof
             proof +=1
-
-        return proof
     
     @staticmethod
     def valid_proof(last_proof, proof):
         """
-        Validates the Proof: Does hash(last_proof, proof) contains 4 leading zeros?
+        Validates the Proof: Does hash(last_proof, proof) start with DIFFICULTY_BITS zero bits?
         :param last_proof: <int> Previous Proof
         :param proof: <int> Current Proof
         :return: <bool> True if correct, False if not.
         """
 
-        guess = f'{last_proof}{proof}'.encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+        guess = b'%d%d' % (last_proof, proof)
+        return hashlib.sha256(guess).digest() < PROOF_TARGET
     
     def register_node(self, address):
         """
@@ -122,66 +341,148 @@ class Blockchain(object):
 
     def valid_chain(self, chain):
         """
-        Determine if a given blockchain is valid
+        Determine if a given blockchain is valid.
+        Each block is hashed at most once, see verified_hash.
         :param self: <list> A blockchain
         :param chain: <bool> True if valid, False if not
         """
 
+        # Peer blocks go into the balance index, so their transactions must be well-formed
+        for block in chain:
+            if type(block) is not dict or type(block.get('transactions')) is not list:
+                return False
+            if not all(self.valid_transaction(tx) for tx in block['transactions']):
+                return False
+
         last_block = chain[0]
+        last_hash = self.verified_hash(last_block, 0)
+        if last_hash is None:
+            return False
         current_index = 1
 
         while current_index < len(chain):
             block = chain[current_index]
-            print(f"{last_block}")
-            print(f"{block}")
-            print("\n-----------\n")
+            # Proofs are ints, which valid_proof formats as plain decimal digits
+            if type(last_block.get('proof')) is not int or type(block.get('proof')) is not int:
+                return False
+
             # Check that the hash of the block is correct
-            if block['previous_hash'] != self.hash(last_block):
+            if block.get('previous_hash') != last_hash:
                 return False
             
             # Check that the Proof of Work is correct
             if not self.valid_proof(last_block['proof'], block['proof']):
                 return False
+
+            block_hash = self.verified_hash(block, current_index)
+            if block_hash is None:
+                return False
             
             last_block = block
+            last_hash = block_hash
             current_index +=1
 
 
         return True
     
+    def verified_hash(self, block, index):
+        """
+        Hash a received block and check it against the block's stored 'hash', which is then kept on the block
+        :param block: <dict> Block
+        :param index: <int> Position of the block in its chain
+        :return: <str> The hash, or None if the stored one doesn't match the contents
+        """
+
+        # A block identical to ours (stored hash included) was already verified, reuse its hash
+        if index < len(self.chain) and block == self.chain[index]:
+            return self.chain[index]['hash']
+
+        # Otherwise the stored hash comes from a peer, so it has to match the block's contents
+        block_hash = self.hash(block)
+        if block.setdefault('hash', block_hash) != block_hash:
+            return None
+        return block_hash
+
     def resolve_conflicts(self):
         """
         This is our Consensus Algorithm, it resolves conflicts by replacing our chain with the longest one in the network
         :return: <bool> True if our chain was replaced, False if not
         """
 
-        neighbours = self.nodes
+        neighbours = list(self.nodes)
         new_chain = None
 
         # We're only looking for chains longer than ours
         max_length = len(self.chain)
 
-        # Grab and verify the chains from all the nodes in our network
-        for node in neighbours:
-            response = requests.get(f"http://{node}/chain")
-
-            if response.status_code == 200:
-                length = response.json()['length']
-                chain = response.json()['chain']
-
-                # Check if the length is longer and the chain is valid
-                if length > max_length and self.valid_chain(chain):
-                    max_length = length
-                    new_chain = chain
+        # Grab the chains from all the nodes in our network at once, verifying each as it arrives
+        if neighbours:
+            with ThreadPoolExecutor(max_workers=min(32, len(neighbours))) as executor:
+                futures = [executor.submit(self.fetch_chain, node) for node in neighbours]
+                for future in as_completed(futures):
+                    chain = future.result()
+                    if chain is None:
+                        continue
+
+                    # Check if the length is longer and the chain is valid
+                    if len(chain) <= max_length:
+                        continue
+                    try:
+                        valid = self.valid_chain(chain)
+                    except (RecursionError, ValueError, TypeError):
+                        # e.g. values nested too deep for json.dumps to hash, skip this peer
+                        valid = False
+                    if valid:
+                        max_length = len(chain)
+                        new_chain = chain
 
         # Replace our chain if we discovered a new, valid chain longer than ours
         if new_chain:
-            self.chain = new_chain
-            return True
+            with self.lock:
+                # Our own chain may have grown while the peers were being fetched
+                if len(new_chain) > len(self.chain):
+                    # Index the new chain first, so nothing is swapped in if that fails
+                    balances, last_hash, block_json = self._index(new_chain, self.current_transactions)
+                    self.chain = new_chain
+                    self.balances = balances
+                    self._last_hash = last_hash
+                    self._block_json = block_json
+                    self.save_chain()
+                    return True
         
         return False
     
+    def fetch_chain(self, node):
+        """
+        Download the chain of a node
+        :param node: <str> Address of the node. Eg. '192.168.0.1:5000'
+        :return: <list> The chain, or None if the node couldn't be reached or replied with garbage
+        """
+
+        try:
+            response = requests.get(f"http://{node}/chain", timeout=5)
+        except requests.RequestException:
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        # json rather than orjson, which would turn amounts wider than 64 bits into floats
+        try:
+            chain = json.loads(response.content)['chain']
+        except (RecursionError, ValueError, KeyError, TypeError):
+            return None
+
+        # The reported 'length' is ignored, the chain itself is what gets counted and checked
+        if type(chain) is not list or not chain or not all(type(block) is dict for block in chain):
+            return None
+        return chain
+
     def get_balance(self, address):
+        return self.balances.get(address, 0)
+
+    def _get_balance_slow(self, address):
+        """Recompute a balance by scanning every transaction, to check the index"""
         balance = 0
         for block in self.chain:
             for tx in block['transactions']:
@@ -198,27 +499,103 @@ class Blockchain(object):
         
         return balance
     
+    def append_block(self, block_json):
+        """Append a single encoded block to the on-disk chain"""
+        append_ndjson_bytes(self.chain_file, block_json)
+
+    def save_mempool(self):
+        """Rewrite the pending transactions on disk, e.g. empty once they were mined"""
+        write_ndjson(self.mempool_file, self.current_transactions)
+
     def save_chain(self):
-        """Save blockchain to disk"""
-        data = {
-            'chain': self.chain,
-            'current_transactions': self.current_transactions
-        }
-        with open(self.chain_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        """Rewrite the whole blockchain on disk, e.g. after it was replaced"""
+        write_ndjson(self.chain_file, self.chain)
+        self.save_mempool()
     
     def load_chain(self):
         """Load blockchain from disk"""
+        if not self.chain_file.exists():
+            self.load_legacy_chain()
+            return
+
+        self.chain = read_ndjson(self.chain_file)
+
+        if self.mempool_file.exists():
+            pending = read_ndjson(self.mempool_file)
+        else:
+            pending = self.load_legacy_mempool()
+
+        # A crash between appending a block and emptying the mempool leaves the block's transactions
+        # in both. Nothing can be added in between, so the mempool then holds exactly those
+        mined = bool(self.chain) and bool(pending) and pending == self.chain[-1]['transactions']
+        if mined:
+            pending = []
+
+        # The only line was the genesis block and it was cut off, start over from a new one
+        regenesis = not self.chain
+        if regenesis:
+            self.new_block(proof=100, previous_hash='0')
+
+        self.current_transactions = pending
+        self._reindex()
+        if mined or regenesis:
+            # Bring the mempool file in line with the pending transactions
+            self.save_mempool()
+
+    def load_legacy_mempool(self):
+        """Load a mempool.json snapshot and convert it to the append-only format"""
         try:
-            with open(self.chain_file, 'r') as f:
+            with open(self.legacy_mempool_file, 'rb') as f:
+                pending = json.load(f)
+        except (ValueError, FileNotFoundError):
+            return []
+        write_ndjson(self.mempool_file, pending)
+        return pending
+
+    def load_legacy_chain(self):
+        """Load a blockchain.json snapshot and convert it to the append-only format"""
+        try:
+            with open(self.legacy_chain_file, 'rb') as f:
                 data = json.load(f)
                 self.chain = data.get('chain', [])
                 self.current_transactions = data.get('current_transactions', [])
-        except (json.JSONDecodeError, FileNotFoundError):
+        except (ValueError, FileNotFoundError):
             # If file is corrupted or doesn't exist, initialize fresh chain
             self.chain = []
             self.current_transactions = []
+            self._reindex()
+            return
+
+        # _reindex stores each block's hash on it, so it runs before the blocks are written out
+        self._reindex()
+        self.save_chain()
+
+    def _reindex(self):
+        """Rebuild the tip hash and balance index after the chain was loaded"""
+        self.balances, self._last_hash, self._block_json = self._index(self.chain, self.current_transactions)
+
+    def _index(self, chain, transactions):
+        """
+        Derive the balance index, tip hash and encoded blocks of a chain
+        :param chain: <list> Blocks
+        :param transactions: <list> Pending transactions on top of the chain
+        :return: <tuple> (balances, last_hash, block_json)
+        """
 
+        balances = defaultdict(int)
+        for block in chain:
+            # Blocks written before hashes were stored get theirs computed once
+            if 'hash' not in block:
+                block['hash'] = self.hash(block)
+            for tx in block['transactions']:
+                balances[tx['recipient']] += tx['amount']
+                balances[tx['sender']] -= tx['amount']
+        for tx in transactions:
+            balances[tx['recipient']] += tx['amount']
+            balances[tx['sender']] -= tx['amount']
+
+        last_hash = chain[-1]['hash'] if chain else '0'
+        return balances, last_hash, [json_bytes(block) for block in chain]
         
     
 app = Flask(__name__, static_folder='.', static_url_path='')
@@ -235,26 +612,34 @@ def index():
 
 @app.route('/api/home', methods=['GET'])
 def home():
-    return jsonify({'message': 'Welcome to PyChain'}), 200
+    return json_response({'message': 'Welcome to PyChain'})
 
 @app.route('/mine', methods=['GET'])
 def mine():
-    # We run the proof of wwork algotritm to get the next proof
-    last_block = blockchain.last_block
-    last_proof = last_block['proof']
-    proof = blockchain.proof_of_work(last_proof)
-
-    # We must recieve a reward for finding the proof.
-    # The sender is "0" to signify that ths node has mined a new coin.
-    blockchain.new_transaction(
-        sender="0",
-        recipient=node_identifier,
-        amount=1,
-    )
-
-    # Forge the new Block by adding it to the chain
-    previous_hash = blockchain.hash(last_block)
-    block = blockchain.new_block(proof, previous_hash)
+    while True:
+        # We run the proof of wwork algotritm to get the next proof
+        # Mining runs without the lock so other requests aren't blocked meanwhile
+        last_block = blockchain.last_block
+        last_proof = last_block['proof']
+        proof = blockchain.proof_of_work(last_proof)
+
+        with blockchain.lock:
+            # Another request extended or replaced the chain while we mined, start over on the new tip
+            if blockchain.last_block is not last_block:
+                continue
+
+            # We must recieve a reward for finding the proof.
+            # The sender is "0" to signify that ths node has mined a new coin.
+            blockchain.new_transaction(
+                sender="0",
+                recipient=node_identifier,
+                amount=1,
+            )
+
+            # Forge the new Block by adding it to the chain
+            previous_hash = blockchain._last_hash
+            block = blockchain.new_block(proof, previous_hash)
+            break
 
     response = {
         'message' : "New Block Forged" , 
@@ -264,7 +649,7 @@ def mine():
         'previous_hash' : block['previous_hash'],
     }
 
-    return jsonify(response), 200
+    return json_response(response)
 
 @app.route('/transactions/new', methods=['POST'])
 def new_transactions():
@@ -275,19 +660,22 @@ def new_transactions():
     if not values or not all(k in values for k in required):
         return 'Missing values', 400
 
+    # Balances are kept as running sums, so only whole-number amounts are accepted
+    if not blockchain.valid_transaction({k: values[k] for k in required}):
+        return 'Invalid values', 400
+
     # Create a new Transaction
     index = blockchain.new_transaction(values['sender'], values['recipient'], values['amount'])
 
     response = {'message': f'Transaction wil be added to Block{index}'}
-    return jsonify(response), 201
+    return json_response(response, 201)
 
 @app.route('/chain', methods=['GET'])
 def full_chain():
-    response = {
-        'chain': blockchain.chain,
-        'length': len(blockchain.chain)
-        }
-    return jsonify(response), 200
+    # A snapshot of the encoded blocks, new blocks may be appended while streaming
+    with blockchain.lock:
+        blocks = list(blockchain._block_json)
+    return stream_json(b'{"length":%d,"chain":[' % len(blocks), blocks, b']}')
 
 @app.route('/nodes/register', methods=['POST'])
 def register_nodes():
@@ -304,34 +692,35 @@ def register_nodes():
         'message': 'New nodes have been added',
         'total_nodes': list(blockchain.nodes),
     }
-    return jsonify(response), 201
+    return json_response(response, 201)
 
 @app.route('/nodes/resolve', methods=['GET'])
 def consensus():
     replaced = blockchain.resolve_conflicts()
 
     if replaced:
-        response = {
-            'message': 'Our chain was replaced',
-            'new_chain': blockchain.chain
-        }
+        message = 'Our chain was replaced'
     else:
-        response = {
-            'message': 'Our chain is authoritative',
-            'new_chain': blockchain.chain
-        }
-    return jsonify(response), 200
+        message = 'Our chain is authoritative'
+
+    with blockchain.lock:
+        blocks = list(blockchain._block_json)
+    return stream_json(b'{"message":%s,"new_chain":[' % json_bytes(message), blocks, b']}')
 
 @app.route('/balance/<address>', methods=['GET'])
 def get_balance(address):
     balance = blockchain.get_balance(address)
-    return jsonify({
+    return json_response({
         'address':address,
         'balance':balance
-    }), 200
+    })
 
 FAUCET_AMOUNT = 100
+FAUCET_COOLDOWN = 60  # seconds
+# address -> monotonic() time of its last faucet payout, oldest payout first.
+# Entries are dropped once their cooldown expires, so only live ones are kept
 faucet_requests = {}
+faucet_lock = RLock()
 
 @app.route('/faucet', methods=['POST'])
 def faucet():
@@ -339,27 +728,36 @@ def faucet():
     address = values.get('address')
 
     if not address:
-        return jsonify({'error': 'Address required'}), 400
-    
-    # Prevent spamming faucet
-    if address in faucet_requests:
-        import time as time_module
-        if time_module.time() - faucet_requests[address] < 60:
-            return jsonify({'error': 'Faucet cooldown. Try again in 1 minute.'}), 429
-    
-    blockchain.new_transaction(
-        sender="0",
-        recipient=address,
-        amount=FAUCET_AMOUNT
-    )
+        return json_response({'error': 'Address required'}, 400)
     
-    faucet_requests[address] = time()
-
-    return jsonify({
+    # Cooldown check and payout happen under one lock so parallel requests can't both pass the check
+    with faucet_lock:
+        # Prevent spamming faucet
+        now = monotonic()
+        if now - faucet_requests.get(address, float('-inf')) < FAUCET_COOLDOWN:
+            return json_response({'error': 'Faucet cooldown. Try again in 1 minute.'}, 429)
+        
+        blockchain.new_transaction(
+            sender="0",
+            recipient=address,
+            amount=FAUCET_AMOUNT
+        )
+        
+        # Expired entries are all at the front, each one is popped once
+        while faucet_requests:
+            oldest = next(iter(faucet_requests))
+            if now - faucet_requests[oldest] < FAUCET_COOLDOWN:
+                break
+            del faucet_requests[oldest]
+        # The address passed the cooldown check, so any old entry of its own was just dropped
+        # and this one lands at the back, keeping the payout order
+        faucet_requests[address] = now
+
+    return json_response({
         'message': f'{FAUCET_AMOUNT} coins sent to {address}',
         'success': True,
         'amount': FAUCET_AMOUNT
-    }), 200
+    })
 
 BURN_ADDRESS = "POST_FEE"
 BASE_POST_COST = 10
@@ -367,52 +765,84 @@ BASE_POST_COST = 10
 # Data persistence
 DATA_DIR = Path('data')
 DATA_DIR.mkdir(exist_ok=True)
-POSTS_FILE = DATA_DIR / 'posts.json'
-USERS_FILE = DATA_DIR / 'users.json'
+# Posts are appended one JSON object per line
+POSTS_FILE = DATA_DIR / 'posts.ndjson'
+# Pre-ndjson format, migrated on first load
+LEGACY_POSTS_FILE = DATA_DIR / 'posts.json'
+# Users are appended one JSON object per line, {'address': ..., **info}
+USERS_FILE = DATA_DIR / 'users.ndjson'
+# Pre-ndjson format, migrated on first load
+LEGACY_USERS_FILE = DATA_DIR / 'users.json'
 
 def load_posts():
     """Load posts from disk"""
     if POSTS_FILE.exists():
+        return read_ndjson(POSTS_FILE)
+    if LEGACY_POSTS_FILE.exists():
         try:
-            with open(POSTS_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, ValueError):
+            with open(LEGACY_POSTS_FILE, 'rb') as f:
+                posts_data = json.load(f)
+        except ValueError:
             return []
+        save_posts(posts_data)
+        return posts_data
     return []
 
 def save_posts(posts_data):
-    """Save posts to disk"""
-    with open(POSTS_FILE, 'w') as f:
-        json.dump(posts_data, f, indent=2)
+    """Rewrite all posts on disk"""
+    write_ndjson(POSTS_FILE, posts_data)
+
+def append_post(post_json):
+    """Save a single new, already encoded post to disk"""
+    append_ndjson_bytes(POSTS_FILE, post_json)
 
 def load_users():
     """Load registered users from disk"""
     if USERS_FILE.exists():
+        users_data = {}
+        for record in read_ndjson(USERS_FILE):
+            address = record.pop('address')
+            users_data[address] = record
+        return users_data
+    if LEGACY_USERS_FILE.exists():
         try:
-            with open(USERS_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, ValueError):
+            with open(LEGACY_USERS_FILE, 'rb') as f:
+                users_data = json.load(f)
+        except ValueError:
             return {}
+        save_users(users_data)
+        return users_data
     return {}
 
 def save_users(users_data):
-    """Save registered users to disk"""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users_data, f, indent=2)
+    """Rewrite all registered users on disk"""
+    write_ndjson(USERS_FILE, ({'address': address, **info} for address, info in users_data.items()))
+
+users = load_users()
+# device_id -> address, so returning devices are found without scanning every user
+device_index = {info['device_id']: address for address, info in users.items() if 'device_id' in info}
+users_lock = RLock()
+
+def register_user(address, info):
+    """Add a user to the registry and append it to disk"""
+    with users_lock:
+        users[address] = info
+        if 'device_id' in info:
+            device_index[info['device_id']] = address
+        append_ndjson(USERS_FILE, {'address': address, **info})
 
 def generate_unique_address():
     """Generate guaranteed unique address"""
-    users = load_users()
-    timestamp = str(int(time() * 1000))  # millisecond timestamp
+    now = time()
+    timestamp = str(int(now * 1000))  # millisecond timestamp
     random_part = str(uuid4())[:8]
     address = f"addr_{timestamp}_{random_part}"
     
     # Save to users registry
-    users[address] = {
-        'created_at': time(),
-        'last_seen': time()
-    }
-    save_users(users)
+    register_user(address, {
+        'created_at': now,
+        'last_seen': now
+    })
     
     return address
 
@@ -423,42 +853,45 @@ def generate_address_endpoint():
     device_id = values.get('device_id')
     
     if not device_id:
-        return jsonify({'error': 'Device ID required'}), 400
-    
-    users = load_users()
+        return json_response({'error': 'Device ID required'}, 400)
     
-    # Check if this device already has an address
-    for address, info in users.items():
-        if info.get('device_id') == device_id:
+    # Lookup and registration under one lock so one device can't get two addresses
+    with users_lock:
+        # Check if this device already has an address
+        address = device_index.get(device_id)
+        if address is not None:
             # Device already registered, return existing address
-            return jsonify({
+            return json_response({
                 'address': address,
                 'success': True,
                 'existing': True,
                 'message': 'Welcome back! Using your existing address.'
-            }), 200
-    
-    # Generate new address for new device
-    timestamp = str(int(time() * 1000))
-    random_part = str(uuid4())[:8]
-    address = f"addr_{timestamp}_{random_part}"
-    
-    # Save with device ID
-    users[address] = {
-        'created_at': time(),
-        'last_seen': time(),
-        'device_id': device_id
-    }
-    save_users(users)
+            })
+        
+        # Generate new address for new device
+        now = time()
+        timestamp = str(int(now * 1000))
+        random_part = str(uuid4())[:8]
+        address = f"addr_{timestamp}_{random_part}"
+        
+        # Save with device ID
+        register_user(address, {
+            'created_at': now,
+            'last_seen': now,
+            'device_id': device_id
+        })
     
-    return jsonify({
+    return json_response({
         'address': address,
         'success': True,
         'existing': False,
         'message': 'New wallet created!'
-    }), 200
+    })
 
 posts = load_posts()
+# Each post encoded once, streamed by /posts
+posts_json = [json_bytes(post_data) for post_data in posts]
+posts_lock = RLock()
 
 def calculate_post_cost():
     """Dynamic cost increases with number of posts"""
@@ -469,51 +902,59 @@ def create_post():
     values = request.get_json()
     address = values.get('address')
     content = values.get('content')
-    cost = calculate_post_cost()
 
     if not address or not content:
-        return jsonify({'error': 'Address and content required'}), 400
-    
-    balance = blockchain.get_balance(address)
-    if balance < cost:
-        return jsonify({
-            'error': 'Insufficient balance',
-            'needed': cost,
-            'balance': balance
-        }), 403
-    
-    # Charge user
-    blockchain.new_transaction(
-        sender=address,
-        recipient=BURN_ADDRESS,
-        amount=cost
-    )
-
-    # Create post with unique ID
-    post_data = {
-        'id': str(uuid4()),
-        'address': address,
-        'content': content,
-        'timestamp': time(),
-        'cost': cost
-    }
-    posts.append(post_data)
-    save_posts(posts)  # Save to disk
+        return json_response({'error': 'Address and content required'}, 400)
+
+    # The cost depends on the post count, and the balance check must hold until the charge lands
+    with posts_lock:
+        cost = calculate_post_cost()
+
+        with blockchain.lock:
+            balance = blockchain.get_balance(address)
+            if balance < cost:
+                return json_response({
+                    'error': 'Insufficient balance',
+                    'needed': cost,
+                    'balance': balance
+                }, 403)
+            
+            # Charge user
+            blockchain.new_transaction(
+                sender=address,
+                recipient=BURN_ADDRESS,
+                amount=cost
+            )
+            new_balance = blockchain.get_balance(address)
+
+        # Create post with unique ID
+        post_data = {
+            'id': str(uuid4()),
+            'address': address,
+            'content': content,
+            'timestamp': time(),
+            'cost': cost
+        }
+        posts.append(post_data)
+        # Encoded once, for /posts and for the log
+        post_json = json_bytes(post_data)
+        posts_json.append(post_json)
+        append_post(post_json)  # Save to disk
 
-    return jsonify({
+    return json_response({
         'message': 'post created',
         'success': True,
         'cost': cost,
-        'new_balance': blockchain.get_balance(address)
-    }), 201
+        'new_balance': new_balance
+    }, 201)
 
 @app.route('/posts', methods=['GET'])
 def get_posts():
-    return jsonify({
-        'posts': posts,
-        'total': len(posts),
-        'next_post_cost': calculate_post_cost()
-    }), 200
+    with posts_lock:
+        encoded_posts = list(posts_json)
+        next_post_cost = calculate_post_cost()
+    head = b'{"total":%d,"next_post_cost":%d,"posts":[' % (len(encoded_posts), next_post_cost)
+    return stream_json(head, encoded_posts, b']}')
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,303 @@
+/*
+ * Multi-lane proof-of-work kernel: hashes several candidate proofs per
+ * SHA-256 transform, one proof per 32-bit SIMD lane.
+ *
+ * Lane i of a batch holds proof base + i. Each lane keeps its own padded 64-byte
+ * block (prefix || decimal digits), the blocks are transposed into a
+ * structure-of-arrays message schedule and compressed together - 8 lanes with
+ * AVX2, 4 lanes with SSE2. The leading-zero test runs on all lanes at once and
+ * movemask picks the lowest matching proof, so results are identical to the
+ * scalar search in Blockchain.proof_of_work.
+ *
+ * Build:
+ *   sh build_kernels.sh   (or: gcc -O3 -shared -fPIC -o pow_multiway.so pow_multiway.c)
+ *
+ * Used by pow_native.py on CPUs without SHA-NI.
+ */
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <cpuid.h>
+#include <immintrin.h>
+
+#define MAX_DIGITS 20
+#define MAX_LANES 8
+
+static const uint32_t K256[64] = {
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+};
+
+static const uint32_t H256[8] = {
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+};
+
+static int has_avx2(void)
+{
+    unsigned int eax, ebx, ecx, edx;
+
+    /* AVX2 also needs the OS to save the YMM registers (OSXSAVE + XCR0). */
+    if (!__get_cpuid(1, &eax, &ebx, &ecx, &edx))
+        return 0;
+    if (!(ecx & bit_OSXSAVE) || !(ecx & bit_AVX))
+        return 0;
+    __asm__("xgetbv" : "=a"(eax), "=d"(edx) : "c"(0));
+    if ((eax & 6) != 6)
+        return 0;
+    if (!__get_cpuid_count(7, 0, &eax, &ebx, &ecx, &edx))
+        return 0;
+    return (ebx & bit_AVX2) != 0;
+}
+
+/* Number of lanes pow_mine_multiway will use on this CPU. */
+int pow_multiway_lanes(void)
+{
+    return has_avx2() ? 8 : 4;
+}
+
+/* ---- 8-way AVX2 ---------------------------------------------------------- */
+
+#define AVX2 __attribute__((target("avx2")))
+
+AVX2 static inline __m256i ror8(__m256i x, int n)
+{
+    return _mm256_or_si256(_mm256_srli_epi32(x, n), _mm256_slli_epi32(x, 32 - n));
+}
+
+AVX2 static inline __m256i add8(__m256i a, __m256i b)
+{
+    return _mm256_add_epi32(a, b);
+}
+
+AVX2 static inline __m256i xor8(__m256i a, __m256i b, __m256i c)
+{
+    return _mm256_xor_si256(_mm256_xor_si256(a, b), c);
+}
+
+AVX2 static void sha256_8way_transform(__m256i state[8], const __m256i msg[16])
+{
+    __m256i a = state[0], b = state[1], c = state[2], d = state[3];
+    __m256i e = state[4], f = state[5], g = state[6], h = state[7];
+    __m256i w[16], t1, t2, s0, s1;
+    int i;
+
+    for (i = 0; i < 64; i++) {
+        if (i < 16) {
+            w[i] = msg[i];
+        } else {
+            s0 = w[(i - 15) & 15];
+            s0 = xor8(ror8(s0, 7), ror8(s0, 18), _mm256_srli_epi32(s0, 3));
+            s1 = w[(i - 2) & 15];
+            s1 = xor8(ror8(s1, 17), ror8(s1, 19), _mm256_srli_epi32(s1, 10));
+            w[i & 15] = add8(add8(w[i & 15], s0), add8(w[(i - 7) & 15], s1));
+        }
+
+        t1 = add8(h, xor8(ror8(e, 6), ror8(e, 11), ror8(e, 25)));
+        t1 = add8(t1, _mm256_xor_si256(_mm256_and_si256(e, f), _mm256_andnot_si256(e, g)));
+        t1 = add8(t1, add8(_mm256_set1_epi32((int)K256[i]), w[i & 15]));
+        t2 = add8(xor8(ror8(a, 2), ror8(a, 13), ror8(a, 22)),
+                  _mm256_or_si256(_mm256_and_si256(a, b), _mm256_and_si256(c, _mm256_or_si256(a, b))));
+
+        h = g; g = f; f = e; e = add8(d, t1);
+        d = c; c = b; b = a; a = add8(t1, t2);
+    }
+
+    state[0] = add8(state[0], a); state[1] = add8(state[1], b);
+    state[2] = add8(state[2], c); state[3] = add8(state[3], d);
+    state[4] = add8(state[4], e); state[5] = add8(state[5], f);
+    state[6] = add8(state[6], g); state[7] = add8(state[7], h);
+}
+
+/* Bitmask of lanes whose (H0, H1) pass the leading-zero test. */
+AVX2 static inline int match8(const uint32_t msg[16][MAX_LANES], uint32_t mask0, uint32_t mask1)
+{
+    const __m256i zero = _mm256_setzero_si256();
+    __m256i state[8], m[16], hit;
+    int i;
+
+    for (i = 0; i < 8; i++)
+        state[i] = _mm256_set1_epi32((int)H256[i]);
+    for (i = 0; i < 16; i++)
+        m[i] = _mm256_loadu_si256((const __m256i *)msg[i]);
+
+    sha256_8way_transform(state, m);
+
+    hit = _mm256_and_si256(
+        _mm256_cmpeq_epi32(_mm256_and_si256(state[0], _mm256_set1_epi32((int)mask0)), zero),
+        _mm256_cmpeq_epi32(_mm256_and_si256(state[1], _mm256_set1_epi32((int)mask1)), zero));
+    return _mm256_movemask_epi8(hit);
+}
+
+/* ---- 4-way SSE2 ---------------------------------------------------------- */
+
+static inline __m128i ror4(__m128i x, int n)
+{
+    return _mm_or_si128(_mm_srli_epi32(x, n), _mm_slli_epi32(x, 32 - n));
+}
+
+static inline __m128i add4(__m128i a, __m128i b)
+{
+    return _mm_add_epi32(a, b);
+}
+
+static inline __m128i xor4(__m128i a, __m128i b, __m128i c)
+{
+    return _mm_xor_si128(_mm_xor_si128(a, b), c);
+}
+
+static void sha256_4way_transform(__m128i state[8], const __m128i msg[16])
+{
+    __m128i a = state[0], b = state[1], c = state[2], d = state[3];
+    __m128i e = state[4], f = state[5], g = state[6], h = state[7];
+    __m128i w[16], t1, t2, s0, s1;
+    int i;
+
+    for (i = 0; i < 64; i++) {
+        if (i < 16) {
+            w[i] = msg[i];
+        } else {
+            s0 = w[(i - 15) & 15];
+            s0 = xor4(ror4(s0, 7), ror4(s0, 18), _mm_srli_epi32(s0, 3));
+            s1 = w[(i - 2) & 15];
+            s1 = xor4(ror4(s1, 17), ror4(s1, 19), _mm_srli_epi32(s1, 10));
+            w[i & 15] = add4(add4(w[i & 15], s0), add4(w[(i - 7) & 15], s1));
+        }
+
+        t1 = add4(h, xor4(ror4(e, 6), ror4(e, 11), ror4(e, 25)));
+        t1 = add4(t1, _mm_xor_si128(_mm_and_si128(e, f), _mm_andnot_si128(e, g)));
+        t1 = add4(t1, add4(_mm_set1_epi32((int)K256[i]), w[i & 15]));
+        t2 = add4(xor4(ror4(a, 2), ror4(a, 13), ror4(a, 22)),
+                  _mm_or_si128(_mm_and_si128(a, b), _mm_and_si128(c, _mm_or_si128(a, b))));
+
+        h = g; g = f; f = e; e = add4(d, t1);
+        d = c; c = b; b = a; a = add4(t1, t2);
+    }
+
+    state[0] = add4(state[0], a); state[1] = add4(state[1], b);
+    state[2] = add4(state[2], c); state[3] = add4(state[3], d);
+    state[4] = add4(state[4], e); state[5] = add4(state[5], f);
+    state[6] = add4(state[6], g); state[7] = add4(state[7], h);
+}
+
+static inline int match4(const uint32_t msg[16][MAX_LANES], uint32_t mask0, uint32_t mask1)
+{
+    const __m128i zero = _mm_setzero_si128();
+    __m128i state[8], m[16], hit;
+    int i;
+
+    for (i = 0; i < 8; i++)
+        state[i] = _mm_set1_epi32((int)H256[i]);
+    for (i = 0; i < 16; i++)
+        m[i] = _mm_loadu_si128((const __m128i *)msg[i]);
+
+    sha256_4way_transform(state, m);
+
+    hit = _mm_and_si128(
+        _mm_cmpeq_epi32(_mm_and_si128(state[0], _mm_set1_epi32((int)mask0)), zero),
+        _mm_cmpeq_epi32(_mm_and_si128(state[1], _mm_set1_epi32((int)mask1)), zero));
+    return _mm_movemask_epi8(hit);
+}
+
+/* ---- candidate layout ---------------------------------------------------- */
+
+struct lane {
+    char digits[MAX_DIGITS + 2];
+    size_t len;
+    uint8_t block[64];
+};
+
+static void build_block(struct lane *l, const char *prefix, size_t prefix_len)
+{
+    uint64_t bits = (uint64_t)(prefix_len + l->len) * 8;
+    int i;
+
+    memset(l->block, 0, 64);
+    memcpy(l->block, prefix, prefix_len);
+    memcpy(l->block + prefix_len, l->digits, l->len);
+    l->block[prefix_len + l->len] = 0x80;
+    for (i = 0; i < 8; i++)
+        l->block[63 - i] = (uint8_t)(bits >> (8 * i));
+}
+
+/* Add k (< 10) to the lane's decimal digits; returns 1 if the length grew. */
+static int digits_add(struct lane *l, unsigned int k)
+{
+    size_t i = l->len;
+    unsigned int v;
+
+    while (k && i > 0) {
+        v = (unsigned int)(l->digits[i - 1] - '0') + k;
+        l->digits[i - 1] = (char)('0' + v % 10);
+        k = v / 10;
+        i--;
+    }
+    if (!k)
+        return 0;
+    memmove(l->digits + 1, l->digits, l->len);
+    l->digits[0] = (char)('0' + k);
+    l->len++;
+    return 1;
+}
+
+static inline uint32_t load_be32(const uint8_t *p)
+{
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) | ((uint32_t)p[2] << 8) | p[3];
+}
+
+/*
+ * Return the first proof >= 0 whose hash with last_proof has difficulty_bits
+ * leading zero bits, or -1 if difficulty_bits is out of range (1..64).
+ */
+int64_t pow_mine_multiway(uint64_t last_proof, unsigned int difficulty_bits)
+{
+    char prefix[MAX_DIGITS + 1];
+    size_t prefix_len, first_word;
+    struct lane lanes[MAX_LANES];
+    uint32_t msg[16][MAX_LANES];
+    uint32_t mask0, mask1;
+    uint64_t base = 0;
+    int wide = has_avx2(), n = wide ? 8 : 4;
+    int i, w, hits;
+
+    if (difficulty_bits == 0 || difficulty_bits > 64)
+        return -1;
+    mask0 = difficulty_bits >= 32 ? 0xFFFFFFFFu : ~(0xFFFFFFFFu >> difficulty_bits);
+    mask1 = difficulty_bits <= 32 ? 0
+          : difficulty_bits >= 64 ? 0xFFFFFFFFu
+          : ~(0xFFFFFFFFu >> (difficulty_bits - 32));
+
+    prefix_len = (size_t)snprintf(prefix, sizeof(prefix), "%llu", (unsigned long long)last_proof);
+    /* Words made only of prefix bytes are the same in every lane and batch. */
+    first_word = prefix_len / 4;
+
+    for (i = 0; i < n; i++) {
+        lanes[i].len = (size_t)snprintf(lanes[i].digits, sizeof(lanes[i].digits), "%d", i);
+        build_block(&lanes[i], prefix, prefix_len);
+    }
+    for (w = 0; w < 16; w++)
+        for (i = 0; i < n; i++)
+            msg[w][i] = load_be32(lanes[i].block + 4 * w);
+
+    for (;;) {
+        hits = wide ? match8(msg, mask0, mask1) : match4(msg, mask0, mask1);
+        if (hits)
+            return (int64_t)(base + (uint64_t)(__builtin_ctz((unsigned int)hits) / 4));
+
+        base += (uint64_t)n;
+        for (i = 0; i < n; i++) {
+            if (digits_add(&lanes[i], (unsigned int)n))
+                build_block(&lanes[i], prefix, prefix_len);
+            else
+                memcpy(lanes[i].block + prefix_len, lanes[i].digits, lanes[i].len);
+        }
+        for (w = (int)first_word; w < 16; w++)
+            for (i = 0; i < n; i++)
+                msg[w][i] = load_be32(lanes[i].block + 4 * w);
+    }
+}
@@ -0,0 +1,77 @@
+"""ctypes bindings for the native proof-of-work kernels (pow_sha_ni.c, pow_multiway.c)"""
+import ctypes
+from pathlib import Path
+
+SHA_NI_PATH = Path(__file__).with_name('pow_sha_ni.so')
+MULTIWAY_PATH = Path(__file__).with_name('pow_multiway.so')
+
+# The kernels work on unsigned 64-bit proofs
+MAX_PROOF = 2**64 - 1
+
+
+def _open(path):
+    try:
+        return ctypes.CDLL(str(path))
+    except OSError:
+        return None
+
+
+def _load_sha_ni():
+    """Return the SHA-NI kernel, or None if it is missing or the CPU lacks SHA-NI"""
+    lib = _open(SHA_NI_PATH)
+    if lib is None:
+        return None
+
+    lib.pow_has_sha_ni.restype = ctypes.c_int
+    lib.pow_has_sha_ni.argtypes = []
+    lib.pow_mine.restype = ctypes.c_int64
+    lib.pow_mine.argtypes = [ctypes.c_uint64, ctypes.c_uint]
+
+    if not lib.pow_has_sha_ni():
+        return None
+    return 'sha-ni', lib.pow_mine
+
+
+def _load_multiway():
+    """Return the 8-way AVX2 / 4-way SSE2 kernel, or None if it is missing"""
+    lib = _open(MULTIWAY_PATH)
+    if lib is None:
+        return None
+
+    lib.pow_multiway_lanes.restype = ctypes.c_int
+    lib.pow_multiway_lanes.argtypes = []
+    lib.pow_mine_multiway.restype = ctypes.c_int64
+    lib.pow_mine_multiway.argtypes = [ctypes.c_uint64, ctypes.c_uint]
+
+    name = 'avx2-8way' if lib.pow_multiway_lanes() == 8 else 'sse2-4way'
+    return name, lib.pow_mine_multiway
+
+
+def _select():
+    """Pick the fastest kernel this machine supports"""
+    for loader in (_load_sha_ni, _load_multiway):
+        kernel = loader()
+        if kernel is not None:
+            return kernel
+    return None, None
+
+
+# Name of the kernel in use ('sha-ni', 'avx2-8way', 'sse2-4way'), or None
+KERNEL, _mine = _select()
+
+
+def mine(last_proof, difficulty_bits):
+    """
+    Find the first proof whose hash with last_proof has difficulty_bits leading zero bits
+    :param last_proof: <int> Previous Proof
+    :param difficulty_bits: <int> Number of leading zero bits required
+    :return: <int> The proof, or None if no native kernel can be used
+    """
+
+    if _mine is None or type(last_proof) is not int or not 0 <= last_proof <= MAX_PROOF:
+        return None
+
+    proof = _mine(last_proof, difficulty_bits)
+    if proof < 0:
+        return None
+    return proof
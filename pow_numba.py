@@ -0,0 +1,139 @@
+"""Numba-compiled proof-of-work search, used when no native kernel has been built"""
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = njit = None
+
+# The kernel keeps proofs in signed 64-bit integers
+MAX_PROOF = 2**63 - 1
+
+MASK32 = 0xFFFFFFFF
+
+K256 = [
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]
+
+H256 = [
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+]
+
+
+def _jit(func):
+    """Compile with Numba when it is installed, caching the machine code on disk.
+    The compiled code releases the GIL, so a search doesn't stall the server's other threads"""
+    if njit is None:
+        return func
+    return njit(cache=True, nogil=True)(func)
+
+
+@_jit
+def _rotr(x, r):
+    # Bits above 31 are left dirty, callers mask once after combining rotations
+    return (x >> r) | (x << (32 - r))
+
+
+@_jit
+def _write_digits(buf, start, value):
+    """Write value in decimal ASCII at buf[start:], return the number of digits"""
+    n = 1
+    v = value // 10
+    while v:
+        n += 1
+        v //= 10
+    for i in range(n - 1, -1, -1):
+        buf[start + i] = 48 + value % 10
+        value //= 10
+    return n
+
+
+@_jit
+def _pad(block, length):
+    """Terminate a single-block message of `length` bytes with SHA-256 padding"""
+    for i in range(length, 64):
+        block[i] = 0
+    block[length] = 0x80
+    bits = length * 8
+    for i in range(8):
+        block[63 - i] = (bits >> (8 * i)) & 0xFF
+
+
+@_jit
+def _compress_head(block, w, k, iv):
+    """Compress one 64-byte block from the IV and return the first two state words"""
+    for t in range(16):
+        w[t] = (block[4 * t] << 24) | (block[4 * t + 1] << 16) | (block[4 * t + 2] << 8) | block[4 * t + 3]
+    for t in range(16, 64):
+        s0 = (_rotr(w[t - 15], 7) ^ _rotr(w[t - 15], 18) ^ (w[t - 15] >> 3)) & MASK32
+        s1 = (_rotr(w[t - 2], 17) ^ _rotr(w[t - 2], 19) ^ (w[t - 2] >> 10)) & MASK32
+        w[t] = (w[t - 16] + s0 + w[t - 7] + s1) & MASK32
+
+    a, b, c, d, e, f, g, h = iv[0], iv[1], iv[2], iv[3], iv[4], iv[5], iv[6], iv[7]
+    for t in range(64):
+        s1 = (_rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)) & MASK32
+        ch = (e & f) ^ (~e & g)
+        t1 = (h + s1 + ch + k[t] + w[t]) & MASK32
+        s0 = (_rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)) & MASK32
+        maj = (a & b) ^ (a & c) ^ (b & c)
+        t2 = (s0 + maj) & MASK32
+        h = g
+        g = f
+        f = e
+        e = (d + t1) & MASK32
+        d = c
+        c = b
+        b = a
+        a = (t1 + t2) & MASK32
+
+    return (a + iv[0]) & MASK32, (b + iv[1]) & MASK32
+
+
+@_jit
+def _mine(last_proof, difficulty_bits, k, iv):
+    block = np.zeros(64, np.int64)
+    w = np.empty(64, np.int64)
+
+    prefix_len = _write_digits(block, 0, last_proof)
+    proof = 0
+    while True:
+        length = prefix_len + _write_digits(block, prefix_len, proof)
+        _pad(block, length)
+        h0, h1 = _compress_head(block, w, k, iv)
+        if difficulty_bits <= 32:
+            if (h0 >> (32 - difficulty_bits)) == 0:
+                return proof
+        elif h0 == 0 and (h1 >> (64 - difficulty_bits)) == 0:
+            return proof
+        proof += 1
+
+
+if np is not None:
+    K256 = np.array(K256, dtype=np.int64)
+    H256 = np.array(H256, dtype=np.int64)
+
+
+def mine(last_proof, difficulty_bits):
+    """
+    Find the first proof whose hash with last_proof has difficulty_bits leading zero bits
+    :param last_proof: <int> Previous Proof
+    :param difficulty_bits: <int> Number of leading zero bits required
+    :return: <int> The proof, or None if Numba isn't installed
+    """
+
+    if njit is None or type(last_proof) is not int or not 0 <= last_proof <= MAX_PROOF:
+        return None
+    if not 1 <= difficulty_bits <= 64:
+        return None
+    return int(_mine(last_proof, difficulty_bits, K256, H256))
+
+
+def warm_up():
+    """Compile (or load from the cache) the search now, so the first /mine doesn't pay for it"""
+    mine(0, 1)
@@ -0,0 +1,164 @@
+/*
+ * Native proof-of-work kernel using the Intel SHA extensions (SHA-NI).
+ *
+ * Searches for the first proof p such that sha256(f"{last_proof}{p}") starts
+ * with `difficulty_bits` zero bits - the same rule as Blockchain.valid_proof.
+ * The candidate is formatted into a single padded 64-byte SHA-256 block and the
+ * decimal digits of the proof are incremented in place, so each attempt costs
+ * one compression and no allocation.
+ *
+ * Build:
+ *   sh build_kernels.sh   (or: gcc -O3 -shared -fPIC -o pow_sha_ni.so pow_sha_ni.c)
+ *
+ * main.py loads the shared object through ctypes (see pow_native.py) and falls
+ * back to hashlib when it is missing or the CPU does not support SHA-NI.
+ */
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <cpuid.h>
+#include <immintrin.h>
+
+/* Longest candidate: two 20-digit uint64 values, well under the 55 bytes
+ * that fit in one padded block. */
+#define MAX_DIGITS 20
+
+static const uint32_t K256[64] = {
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+};
+
+static const uint32_t H256[8] = {
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+};
+
+int pow_has_sha_ni(void)
+{
+    unsigned int eax, ebx, ecx, edx;
+
+    /* SSSE3 and SSE4.1 are needed for the byte shuffles and blends. */
+    if (!__get_cpuid(1, &eax, &ebx, &ecx, &edx))
+        return 0;
+    if (!(ecx & bit_SSSE3) || !(ecx & bit_SSE4_1))
+        return 0;
+    if (!__get_cpuid_count(7, 0, &eax, &ebx, &ecx, &edx))
+        return 0;
+    return (ebx & bit_SHA) != 0;
+}
+
+/*
+ * One SHA-256 compression of a 64-byte block starting from the standard IV.
+ * Writes the first two state words (the first 8 bytes of the digest).
+ */
+__attribute__((target("sha,sse4.1,ssse3")))
+static inline uint64_t sha256_ni_head(const uint8_t block[64])
+{
+    const __m128i MASK = _mm_set_epi64x(0x0c0d0e0f08090a0bULL, 0x0405060700010203ULL);
+    __m128i state0, state1, abef_save, cdgh_save, msg, tmp;
+    __m128i w[16];
+    uint32_t out[8];
+    int g;
+
+    tmp = _mm_loadu_si128((const __m128i *)&H256[0]);
+    state1 = _mm_loadu_si128((const __m128i *)&H256[4]);
+    tmp = _mm_shuffle_epi32(tmp, 0xB1);          /* CDAB */
+    state1 = _mm_shuffle_epi32(state1, 0x1B);    /* EFGH */
+    state0 = _mm_alignr_epi8(tmp, state1, 8);    /* ABEF */
+    state1 = _mm_blend_epi16(state1, tmp, 0xF0); /* CDGH */
+
+    abef_save = state0;
+    cdgh_save = state1;
+
+    for (g = 0; g < 16; g++) {
+        if (g < 4) {
+            w[g] = _mm_shuffle_epi8(_mm_loadu_si128((const __m128i *)(block + 16 * g)), MASK);
+        } else {
+            tmp = _mm_sha256msg1_epu32(w[g - 4], w[g - 3]);
+            tmp = _mm_add_epi32(tmp, _mm_alignr_epi8(w[g - 1], w[g - 2], 4));
+            w[g] = _mm_sha256msg2_epu32(tmp, w[g - 1]);
+        }
+        msg = _mm_add_epi32(w[g], _mm_loadu_si128((const __m128i *)&K256[4 * g]));
+        state1 = _mm_sha256rnds2_epu32(state1, state0, msg);
+        msg = _mm_shuffle_epi32(msg, 0x0E);
+        state0 = _mm_sha256rnds2_epu32(state0, state1, msg);
+    }
+
+    state0 = _mm_add_epi32(state0, abef_save);
+    state1 = _mm_add_epi32(state1, cdgh_save);
+
+    tmp = _mm_shuffle_epi32(state0, 0x1B);       /* FEBA */
+    state1 = _mm_shuffle_epi32(state1, 0xB1);    /* DCHG */
+    state0 = _mm_blend_epi16(tmp, state1, 0xF0); /* DCBA */
+    state1 = _mm_alignr_epi8(state1, tmp, 8);    /* ABEF */
+
+    _mm_storeu_si128((__m128i *)&out[0], state0);
+    _mm_storeu_si128((__m128i *)&out[4], state1);
+    return ((uint64_t)out[0] << 32) | out[1];
+}
+
+/* Lay out prefix || digits as a single padded SHA-256 block. */
+static void build_block(uint8_t block[64], const char *prefix, size_t prefix_len,
+                        const char *digits, size_t digits_len)
+{
+    uint64_t bits = (uint64_t)(prefix_len + digits_len) * 8;
+    int i;
+
+    memset(block, 0, 64);
+    memcpy(block, prefix, prefix_len);
+    memcpy(block + prefix_len, digits, digits_len);
+    block[prefix_len + digits_len] = 0x80;
+    for (i = 0; i < 8; i++)
+        block[63 - i] = (uint8_t)(bits >> (8 * i));
+}
+
+/*
+ * Return the first proof >= 0 whose hash with last_proof has difficulty_bits
+ * leading zero bits, or -1 if difficulty_bits is out of range (1..64).
+ */
+__attribute__((target("sha,sse4.1,ssse3")))
+int64_t pow_mine(uint64_t last_proof, unsigned int difficulty_bits)
+{
+    char prefix[MAX_DIGITS + 1];
+    char digits[MAX_DIGITS + 1] = "0";
+    size_t prefix_len, digits_len = 1;
+    uint8_t block[64];
+    uint64_t proof = 0;
+    unsigned int shift;
+
+    if (difficulty_bits == 0 || difficulty_bits > 64)
+        return -1;
+    shift = 64 - difficulty_bits;
+
+    prefix_len = (size_t)snprintf(prefix, sizeof(prefix), "%llu", (unsigned long long)last_proof);
+    build_block(block, prefix, prefix_len, digits, digits_len);
+
+    for (;;) {
+        if ((sha256_ni_head(block) >> shift) == 0)
+            return (int64_t)proof;
+
+        /* Increment the decimal digits in place, rebuilding only on carry-out. */
+        proof++;
+        {
+            size_t i = digits_len;
+            while (i > 0 && digits[i - 1] == '9') {
+                digits[i - 1] = '0';
+                i--;
+            }
+            if (i == 0) {
+                memmove(digits + 1, digits, digits_len);
+                digits[0] = '1';
+                digits_len++;
+                build_block(block, prefix, prefix_len, digits, digits_len);
+            } else {
+                digits[i - 1]++;
+                memcpy(block + prefix_len, digits, digits_len);
+            }
+        }
+    }
+}